@@ -1,40 +1,528 @@
-import requests
-from bs4 import BeautifulSoup
-
-def get_links(url):
-    # Send a GET request to the URL
-    response = requests.get(url)
-    # If the GET request is successful, the status code will be 200
-    if response.status_code == 200:
-        # Get the content of the response
-        page_content = response.content
-        # Create a BeautifulSoup object and specify the parser
-        soup = BeautifulSoup(page_content, 'html.parser')
-        # Find all the anchor tags in the HTML
-        # Extract the href attribute and add it to a set (to avoid duplicates)
-        links = set()
-        for anchor in soup.find_all('a'):
-            link = anchor.get('href')
-            # Skip tags where href attribute is not present or does not start with 'http'
+import argparse
+import codecs
+import functools
+import html
+import importlib
+import os
+import re
+import sys
+
+# Third-party packages (and asyncio) are imported where they are first used, so
+# that a short single-URL run only pays for the modules it actually needs
+
+@functools.lru_cache(maxsize=None)
+def _optional_import(name):
+    # Import an optional dependency; None when it is not installed
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+# Number of pages handed to a worker process at a time
+_CHUNK_SIZE = 8
+
+# Seconds a single page fetch may take before it is given up (for requests, the
+# connect and read timeouts)
+_TIMEOUT = 30
+
+# Size of the pieces a response body is read in
+_READ_CHUNK_SIZE = 64 * 1024
+
+# Buffer size of the file LinkSink appends to
+_WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Starts the reply line a --serve server sends when a URL can't be fetched
+_ERROR_PREFIX = 'ERROR '
+
+# Matches the first href attribute of an anchor tag (double-quoted, single-quoted
+# or bare) when its value starts with 'http', so other hrefs are never decoded at
+# all. The other attributes are skipped one by one, so an 'href=' inside another
+# attribute's value is not mistaken for the href. HTML comments are matched too
+# (with no group set) so that the anchors inside them are skipped.
+_A_HREF_RE = re.compile(rb'''
+    <!--.*?(?:-->|\Z)
+  | <a(?:\s+(?!href\s*=)[^\s>="'<]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s>"'<]+))?)*
+    \s+href\s*=\s*(?:"((?-i:http)[^"]*)"|'((?-i:http)[^']*)'|((?-i:http)[^\s>"']*))
+''', re.I | re.S | re.X)
+
+def scan_hrefs(page_content, encoding='utf-8'):
+    # Scan the raw bytes for anchor hrefs starting with 'http' without building a parse tree.
+    # Pages repeat the same href many times (menus, footers), so collect the
+    # unique raw values first and decode each of them only once
+    values = {next(group for group in match.groups() if group is not None)
+              for match in _A_HREF_RE.finditer(page_content)
+              if match.lastindex is not None}
+    for value in values:
+        try:
+            link = value.decode(encoding)
+        except UnicodeDecodeError:
+            # Drop an href that is not valid in the page's charset rather than
+            # write out a mangled URL
+            continue
+        # Attribute values may contain entities such as &amp;
+        if '&' in link:
+            link = html.unescape(link)
+        yield link
+
+@functools.lru_cache(maxsize=1)
+def _anchor_strainer():
+    # Only anchors with an 'http' href become tree nodes when BeautifulSoup is used
+    from bs4 import SoupStrainer
+    return SoupStrainer('a', href=re.compile('^http'))
+
+def declared_charset(content_type):
+    # The charset parameter of a Content-Type header, or None when there is none
+    # (or it names an encoding Python does not know)
+    for param in content_type.split(';')[1:]:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            charset = value.strip().strip('"\'').lower()
+            try:
+                codecs.lookup(charset)
+            except LookupError:
+                return None
+            return charset
+    return None
+
+def extract_links(page_content, strict=False, encoding=None):
+    # Collect the href of every anchor tag into a set (to avoid duplicates).
+    # encoding is the charset the server declared for page_content, if any
+    if isinstance(page_content, str):
+        page_content = page_content.encode('utf-8')
+        encoding = 'utf-8'
+    if not strict:
+        # Fast path: a single regex scan over the page bytes. The regex only
+        # matches 'http' hrefs, so there is nothing left to filter; without a
+        # declared charset the hrefs are decoded as UTF-8
+        return set(scan_hrefs(page_content, encoding or 'utf-8'))
+    if encoding is not None:
+        # Let the parsers work on text decoded with the declared charset
+        page_content = page_content.decode(encoding, 'replace')
+    # selectolax (lexbor backend) is the fastest parser; BeautifulSoup remains the fallback
+    lexbor = _optional_import('selectolax.lexbor')
+    if lexbor is not None:
+        tree = lexbor.LexborHTMLParser(page_content)
+        # Let the CSS selector check the 'http' prefix inside lexbor
+        return {anchor.attributes['href'] for anchor in tree.css('a[href^="http"]')}
+    # Given bytes without a declared charset, BeautifulSoup runs a slow
+    # encoding detector over the whole page; try UTF-8 first instead
+    if isinstance(page_content, bytes):
+        try:
+            page_content = page_content.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+    from bs4 import BeautifulSoup
+    # Prefer the lxml parser (C code) and fall back to the pure-Python one
+    parser = 'lxml' if _optional_import('lxml') is not None else 'html.parser'
+    # Create a BeautifulSoup object and specify the parser; the strainer
+    # skips building nodes for everything but the wanted anchors
+    soup = BeautifulSoup(page_content, parser, parse_only=_anchor_strainer())
+    return {anchor['href'] for anchor in soup.find_all('a')}
+
+@functools.lru_cache(maxsize=1)
+def get_session():
+    # The session is shared by every call so that its connection pool
+    # (keep-alive connections) is reused across requests
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=100, pool_maxsize=100)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _read_anchor_events(parser, links):
+    for _, elem in parser.read_events():
+        if elem.tag == 'a':
+            link = elem.get('href')
             if link is not None and link.startswith('http'):
                 links.add(link)
-        # Return the set of links
-        return links
+        # Discard the finished element and its earlier siblings to keep memory bounded
+        elem.clear()
+        # The root element has no parent, though it can have earlier siblings
+        # (a comment before <html>)
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
 
-def write_to_file(links, filename):
-    # Open the file in write mode
-    with open(filename, 'w') as f:
-        # Write each link on a separate line
+def is_html(content_type):
+    # A missing Content-Type is given the benefit of the doubt
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    return not media_type or media_type in ('text/html', 'application/xhtml+xml')
+
+def _iter_body(response, max_bytes=None):
+    # Yield the body in chunks, stopping once max_bytes have been read
+    read = 0
+    for chunk in response.iter_content(_READ_CHUNK_SIZE):
+        if max_bytes is not None:
+            chunk = chunk[:max_bytes - read]
+            read += len(chunk)
+        yield chunk
+        if max_bytes is not None and read >= max_bytes:
+            break
+
+def extract_links_stream(response, strict=False, max_bytes=None):
+    # With lxml, strict parsing runs incrementally on the body while it downloads
+    encoding = declared_charset(response.headers.get('Content-Type', ''))
+    etree = _optional_import('lxml.etree') if strict else None
+    if etree is None:
+        return extract_links(b''.join(_iter_body(response, max_bytes)), strict, encoding)
+    links = set()
+    parser = etree.HTMLPullParser(events=('end',), encoding=encoding)
+    for chunk in _iter_body(response, max_bytes):
+        parser.feed(chunk)
+        _read_anchor_events(parser, links)
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        # Raised for an empty document
+        pass
+    _read_anchor_events(parser, links)
+    return links
+
+def get_links(url, strict=False, max_bytes=None):
+    # Send a GET request to the URL; the body is read lazily
+    with get_session().get(url, stream=True, timeout=_TIMEOUT) as response:
+        # If the GET request is successful, the status code will be 200;
+        # there are no links to report otherwise
+        if response.status_code != 200:
+            return set()
+        # Don't download bodies that are not HTML (PDFs, images, ...)
+        if not is_html(response.headers.get('Content-Type', '')):
+            return set()
+        # Find all the anchor tags in the HTML and return the set of links
+        return extract_links_stream(response, strict, max_bytes)
+
+async def _fetch(session, semaphore, url, max_bytes=None):
+    # Return the URL, its body (None when it can't be used) and its declared charset.
+    # A URL that is malformed or fails to download is skipped instead of aborting
+    # the whole batch (a bad host name raises UnicodeError, a ValueError)
+    import asyncio
+    import aiohttp
+    try:
+        return await _fetch_body(session, semaphore, url, max_bytes)
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError):
+        return url, None, None
+
+async def _fetch_body(session, semaphore, url, max_bytes=None):
+    # Limit the number of requests in flight at the same time
+    async with semaphore:
+        async with session.get(url) as response:
+            content_type = response.headers.get('Content-Type', '')
+            if response.status != 200 or not is_html(content_type):
+                return url, None, None
+            encoding = declared_charset(content_type)
+            if max_bytes is None:
+                return url, await response.read(), encoding
+            body = bytearray()
+            async for chunk in response.content.iter_chunked(_READ_CHUNK_SIZE):
+                body += chunk[:max_bytes - len(body)]
+                if len(body) >= max_bytes:
+                    break
+            return url, bytes(body), encoding
+
+async def _fetch_http2(client, semaphore, url, max_bytes=None):
+    # Same as _fetch, for an httpx client
+    import httpx
+    try:
+        return await _fetch_body_http2(client, semaphore, url, max_bytes)
+    except (httpx.HTTPError, httpx.InvalidURL, OSError):
+        return url, None, None
+
+async def _fetch_body_http2(client, semaphore, url, max_bytes=None):
+    async with semaphore:
+        async with client.stream('GET', url) as response:
+            content_type = response.headers.get('Content-Type', '')
+            if response.status_code != 200 or not is_html(content_type):
+                return url, None, None
+            encoding = declared_charset(content_type)
+            body = bytearray()
+            async for chunk in response.aiter_bytes(_READ_CHUNK_SIZE):
+                if max_bytes is None:
+                    body += chunk
+                    continue
+                body += chunk[:max_bytes - len(body)]
+                if len(body) >= max_bytes:
+                    break
+            return url, bytes(body), encoding
+
+def _open_client(http2=False):
+    # Return the client for a batch along with the function that fetches with it
+    if http2:
+        import httpx
+        # Requests to the same host are multiplexed over a single HTTP/2 connection
+        limits = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        client = httpx.AsyncClient(http2=True, limits=limits, timeout=_TIMEOUT,
+                                   follow_redirects=True)
+        return client, _fetch_http2
+    import aiohttp
+    connector = aiohttp.TCPConnector(limit=64, limit_per_host=8)
+    timeout = aiohttp.ClientTimeout(total=_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout), _fetch
+
+def _extract_chunk(pages, strict):
+    # Runs in a worker process; several pages are parsed per submission to amortize IPC
+    return [(url, extract_links(page_content, strict, encoding))
+            for url, page_content, encoding in pages]
+
+async def _run(urls, strict=False, max_bytes=None, sink=None, http2=False):
+    import asyncio
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(64)
+    client, fetch_page = _open_client(http2)
+    results = {url: set() for url in urls} if sink is None else None
+    pending = set()
+    failures = []
+
+    def collect(parsed):
+        # Called as soon as a chunk is parsed, so its links reach the sink while
+        # the other pages are still being fetched and are not kept around
+        pending.discard(parsed)
+        if parsed.exception() is not None:
+            failures.append(parsed.exception())
+            return
+        for url, links in parsed.result():
+            if sink is None:
+                results[url] = links
+            else:
+                sink.update(links)
+
+    # Parsing is CPU-bound, so run it in worker processes to get around the GIL.
+    # The workers must not be forked from this process, whose other threads
+    # (such as aiohttp's resolver) could leave a forked worker deadlocked
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    context = multiprocessing.get_context(start_method)
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=context) as pool:
+        def submit(chunk):
+            parsed = loop.run_in_executor(pool, _extract_chunk, chunk, strict)
+            parsed.add_done_callback(collect)
+            pending.add(parsed)
+
+        async with client:
+            chunk = []
+            for fetch in asyncio.as_completed([fetch_page(client, semaphore, url, max_bytes) for url in urls]):
+                url, page_content, encoding = await fetch
+                if page_content is None:
+                    continue
+                chunk.append((url, page_content, encoding))
+                if len(chunk) == _CHUNK_SIZE:
+                    submit(chunk)
+                    chunk = []
+            if chunk:
+                submit(chunk)
+        if pending:
+            await asyncio.wait(list(pending))
+    if failures:
+        raise failures[0]
+    return results
+
+def extract_many(urls, strict=False, max_bytes=None, sink=None, http2=False):
+    # Fetch all the URLs concurrently and return a dict mapping each URL to its set of links.
+    # If a sink (such as a LinkSink) is given, the links are added to it as soon as
+    # each page is parsed instead, and None is returned
+    # aiohttp (or httpx for --http2) is only needed to fetch many URLs at once
+    # httpx only speaks HTTP/2 when the h2 package is installed as well
+    if http2 and (_optional_import('httpx') is None or _optional_import('h2') is None):
+        raise RuntimeError('httpx[http2] (httpx and h2) is required to fetch over HTTP/2')
+    if not http2 and _optional_import('aiohttp') is None:
+        raise RuntimeError('aiohttp is required to extract links from many URLs')
+    import asyncio
+    return asyncio.run(_run(urls, strict, max_bytes, sink, http2))
+
+def read_urls(filename):
+    # One URL per line; blank lines and lines starting with '#' are ignored
+    with open(filename) as f:
+        urls = [line.strip() for line in f]
+    return list(dict.fromkeys(url for url in urls if url and not url.startswith('#')))
+
+class LinkSink:
+    # Deduplicates the links of many pages and appends each new one to a file,
+    # so the links never have to be held in memory all at once. With pybloom_live
+    # a scalable bloom filter needs only a few bits per link, at the cost of a
+    # rare false positive dropping a link; without it a set is used.
+    def __init__(self, filename):
+        pybloom = _optional_import('pybloom_live')
+        if pybloom is not None:
+            self.seen = pybloom.ScalableBloomFilter(initial_capacity=100000, error_rate=0.0001,
+                                                    mode=pybloom.ScalableBloomFilter.LARGE_SET_GROWTH)
+        else:
+            self.seen = set()
+        self.count = 0
+        # A large buffer turns the many small appends into few write calls
+        self.file = open(filename, 'w', encoding='utf-8', buffering=_WRITE_BUFFER_SIZE)
+
+    def add(self, link):
+        if link in self.seen:
+            return
+        self.seen.add(link)
+        self.file.write(link + "\n")
+        self.count += 1
+
+    def update(self, links):
         for link in links:
-            f.write(link + "\n")
+            self.add(link)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_to_file(links, filename):
+    # Put each link on a separate line and encode the whole payload once
+    data = "".join(link + "\n" for link in links).encode('utf-8')
+    # Open the file in binary write mode and write it with a single call
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+def _remove_stale_socket(path):
+    # Remove the socket left behind by a server that is no longer running, but
+    # never a regular file or the socket of a server that is still listening
+    import socket
+    import stat
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise RuntimeError(f'{path} exists and is not a socket')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    raise RuntimeError(f'another server is already listening on {path}')
+
+def serve(path, strict=False, max_bytes=None):
+    # Answer link requests on a UNIX socket, reusing the same session (and so
+    # its open connections) for every request. Each line a client sends is a
+    # URL; the reply is its links, one per line, followed by an empty line.
+    # When the links can't be fetched the reply is a single line starting with
+    # _ERROR_PREFIX (which no link does), followed by an empty line.
+    import socketserver
+
+    class LinkRequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    url = line.decode('utf-8').strip()
+                    if not url:
+                        continue
+                    links = get_links(url, strict, max_bytes)
+                except Exception as exc:
+                    # Any failure (network, parsing, a bad request line) is
+                    # reported to the client instead of dropping the connection
+                    message = " ".join(f"{type(exc).__name__}: {exc}".split())
+                    self.wfile.write(f"{_ERROR_PREFIX}{message}\n\n".encode('utf-8'))
+                    continue
+                self.wfile.write("".join(link + "\n" for link in links).encode('utf-8') + b"\n")
+
+    _remove_stale_socket(path)
+    with socketserver.ThreadingUnixStreamServer(path, LinkRequestHandler) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(path)
+
+def get_links_from_server(path, url):
+    # Ask a server started with serve() for the links of a URL
+    import socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(url.encode('utf-8') + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+        links = set()
+        with sock.makefile('rb') as f:
+            for line in f:
+                link = line.decode('utf-8').rstrip("\n")
+                # An empty line ends the reply
+                if not link:
+                    return links
+                if link.startswith(_ERROR_PREFIX):
+                    message = link[len(_ERROR_PREFIX):]
+                    raise RuntimeError(f'the server could not get the links of {url}: {message}')
+                links.add(link)
+    raise RuntimeError(f'the server closed the connection before answering for {url}')
+
+def positive_int(value):
+    # argparse type for options that only make sense above zero
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive integer')
+    return number
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Extract all unique absolute URLs from a webpage.')
+    parser.add_argument('url', nargs='?', help='URL of the page to extract links from')
+    parser.add_argument('filename', nargs='?', help='path of the file the links are written to')
+    parser.add_argument('--input-file',
+                        help='file with one URL per line to extract links from (instead of url)')
+    parser.add_argument('--strict-parse', action='store_true',
+                        help='use a full HTML parser instead of the fast regex scan')
+    parser.add_argument('--http2', action='store_true',
+                        help='fetch the --input-file URLs with httpx over HTTP/2')
+    parser.add_argument('--max-bytes', type=positive_int,
+                        help='read at most this many bytes of each page')
+    parser.add_argument('--serve', metavar='SOCKET',
+                        help='keep running and answer link requests on this UNIX socket')
+    parser.add_argument('--client', metavar='SOCKET',
+                        help='get the links of url from a server started with --serve')
+    args = parser.parse_args()
+    # A single positional argument is the output file (as with --input-file)
+    if args.filename is None and args.url is not None:
+        args.url, args.filename = None, args.url
+    if args.serve:
+        if args.filename is not None or args.input_file or args.client:
+            parser.error('--serve takes no url, filename, --input-file or --client')
+        return args
+    if args.filename is None:
+        parser.error('the output filename is required')
+    if (args.url is None) == (args.input_file is None):
+        parser.error('give either a url or --input-file')
+    if args.http2 and args.input_file is None:
+        parser.error('--http2 can only be used with --input-file')
+    if args.client and args.url is None:
+        parser.error('--client can only be used with a url')
+    # The server parses with the options it was started with
+    if args.client and (args.strict_parse or args.max_bytes is not None):
+        parser.error('--strict-parse and --max-bytes go to --serve, not --client')
+    return args
 
 def main():
-    url = 'https://www.example.com/mypage'
-    # Provide an absolute path where you want to store the file
-    filename = '/path/to/your/output/file.txt'
-    links = get_links(url)
-    write_to_file(links, filename)
-    print(f"Extracted {len(links)} links and wrote them to {filename}")
+    args = parse_args()
+    if args.serve:
+        print(f"Serving link requests on {args.serve}")
+        try:
+            serve(args.serve, args.strict_parse, args.max_bytes)
+        except RuntimeError as exc:
+            sys.exit(f"Error: {exc}")
+        return
+    filename = args.filename
+    if args.client:
+        try:
+            links = get_links_from_server(args.client, args.url)
+        except RuntimeError as exc:
+            sys.exit(f"Error: {exc}")
+        write_to_file(links, filename)
+        count = len(links)
+    elif args.input_file:
+        # Links are written out as they are found instead of being collected first
+        with LinkSink(filename) as sink:
+            extract_many(read_urls(args.input_file), args.strict_parse, args.max_bytes, sink,
+                         args.http2)
+        count = sink.count
+    else:
+        links = get_links(args.url, args.strict_parse, args.max_bytes)
+        write_to_file(links, filename)
+        count = len(links)
+    print(f"Extracted {count} links and wrote them to {filename}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,218 @@
+import importlib.util
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import link_extractor
+from link_extractor import declared_charset, extract_links, extract_links_stream, get_links_from_server
+
+# Each page is paired with the links both the regex scan and --strict-parse must find
+CASES = {
+    'double quotes': (b'<a href="http://a.com/x">x</a>', {'http://a.com/x'}),
+    'single quotes': (b"<a href='https://a.com/y'>y</a>", {'https://a.com/y'}),
+    'bare value': (b'<a href=http://a.com/z>z</a>', {'http://a.com/z'}),
+    'upper-case tag and attribute': (b'<A HREF="http://a.com/up">up</A>', {'http://a.com/up'}),
+    'scheme prefix is case-sensitive': (b'<a href="HTTP://a.com/caps">caps</a>', set()),
+    'relative and other schemes': (b'<a href="/rel">r</a><a href="mailto:x@a.com">m</a>', set()),
+    'entities': (b'<a href="http://a.com/?a=1&amp;b=2&#38;c=3">e</a>', {'http://a.com/?a=1&b=2&c=3'}),
+    'comment': (b'<!-- <a href="http://a.com/hidden">h</a> --><a href="http://a.com/shown">s</a>',
+                {'http://a.com/shown'}),
+    'abbr is not an anchor': (b'<abbr href="http://a.com/abbr">ab</abbr>', set()),
+    'href inside another attribute': (b'<a href="/r" data-x=" href=http://a.com/inattr">i</a>', set()),
+    'other attributes first': (b'<a class="nav" title="a>b" hreflang=en href="http://a.com/o">o</a>',
+                               {'http://a.com/o'}),
+    'comment before the root element': (b'<!DOCTYPE html><!-- c --><html><body>'
+                                        b'<a href="http://a.com/t">t</a></body></html>',
+                                        {'http://a.com/t'}),
+    'unquoted values around spaced equals signs': (b'<a x = y z= w href = http://a.com/s>s</a>',
+                                                   {'http://a.com/s'}),
+    'duplicates': (b'<a href="http://a.com/d">1</a><a href="http://a.com/d">2</a>', {'http://a.com/d'}),
+}
+
+HAVE_STRICT_PARSER = any(importlib.util.find_spec(name) is not None
+                         for name in ('bs4', 'selectolax'))
+HAVE_LXML = importlib.util.find_spec('lxml') is not None
+HAVE_AIOHTTP = importlib.util.find_spec('aiohttp') is not None
+
+
+class FakeResponse:
+    # Stands in for a streamed requests response, handing out the body in small chunks
+    def __init__(self, body, content_type='text/html', chunk_size=7):
+        self.body = body
+        self.headers = {'Content-Type': content_type}
+        self.chunk_size = chunk_size
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+
+class ExtractLinksTest(unittest.TestCase):
+    def check_cases(self, strict):
+        for name, (page, expected) in CASES.items():
+            with self.subTest(name):
+                self.assertEqual(extract_links(page, strict), expected)
+
+    def test_regex_scan(self):
+        self.check_cases(strict=False)
+
+    @unittest.skipUnless(HAVE_STRICT_PARSER, 'needs beautifulsoup4 or selectolax')
+    def test_strict_parse(self):
+        self.check_cases(strict=True)
+
+    def test_regex_scan_many_attributes(self):
+        # Each 'x = y' could once be read either as a value or as the next
+        # attribute's name, which made the scan double in time per attribute
+        # (about 2 s for the 22 attributes of an anchor without an href)
+        for attribute in (b'x = y ', b'x= y '):
+            with self.subTest(attribute):
+                page = b'<a ' + attribute * 22 + b'>a</a><a ' + attribute * 22 + b'href="http://a.com/m">m</a>'
+                started = time.perf_counter()
+                self.assertEqual(extract_links(page), {'http://a.com/m'})
+                self.assertLess(time.perf_counter() - started, 0.5)
+
+    def check_stream_cases(self, strict):
+        for name, (page, expected) in CASES.items():
+            with self.subTest(name):
+                self.assertEqual(extract_links_stream(FakeResponse(page), strict), expected)
+
+    def test_stream(self):
+        self.check_stream_cases(strict=False)
+
+    @unittest.skipUnless(HAVE_LXML, 'needs lxml')
+    def test_stream_strict_parse(self):
+        # With lxml, strict parsing goes through the incremental pull parser
+        self.check_stream_cases(strict=True)
+
+    def test_stream_max_bytes(self):
+        page = b'<a href="http://a.com/1">1</a><a href="http://a.com/2">2</a>'
+        self.assertEqual(extract_links_stream(FakeResponse(page), max_bytes=30), {'http://a.com/1'})
+
+    def test_declared_charset(self):
+        page = '<a href="http://é.com/">e</a>'.encode('windows-1252')
+        encoding = declared_charset('text/html; charset="Windows-1252"')
+        self.assertEqual(extract_links(page, encoding=encoding), {'http://é.com/'})
+        # Without a declared charset the bytes are not valid UTF-8, so the href is dropped
+        self.assertEqual(extract_links(page), set())
+
+    def test_declared_charset_missing_or_unknown(self):
+        self.assertIsNone(declared_charset('text/html'))
+        self.assertIsNone(declared_charset('text/html; charset=no-such-charset'))
+
+
+
+class FakeClient:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+async def fake_fetch(client, semaphore, url, max_bytes=None):
+    # Every page links to a shared page and to one of its own
+    if 'down' in url:
+        return url, None, None
+    page = f'<a href="http://a.com/shared">s</a><a href="{url}/own">o</a>'
+    return url, page.encode('utf-8'), None
+
+
+class LinkSinkTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, 'links.txt')
+
+    def read_lines(self):
+        with open(self.filename, encoding='utf-8') as f:
+            return f.read().splitlines()
+
+    def test_duplicates_are_written_once(self):
+        with link_extractor.LinkSink(self.filename) as sink:
+            sink.update(['http://a.com/1', 'http://a.com/2', 'http://a.com/1'])
+            sink.add('http://a.com/2')
+            sink.add('http://a.com/3')
+        self.assertEqual(self.read_lines(), ['http://a.com/1', 'http://a.com/2', 'http://a.com/3'])
+        self.assertEqual(sink.count, 3)
+
+    @unittest.skipUnless(HAVE_AIOHTTP, 'needs aiohttp')
+    def test_extract_many_into_sink(self):
+        urls = [f'http://site{number}.com' for number in range(20)] + ['http://down.com']
+        with mock.patch.object(link_extractor, '_open_client', lambda http2=False: (FakeClient(), fake_fetch)):
+            with link_extractor.LinkSink(self.filename) as sink:
+                self.assertIsNone(link_extractor.extract_many(urls, sink=sink))
+            results = link_extractor.extract_many(urls)
+        expected = {'http://a.com/shared'} | {f'http://site{number}.com/own' for number in range(20)}
+        self.assertEqual(sorted(self.read_lines()), sorted(expected))
+        self.assertEqual(sink.count, len(expected))
+        self.assertEqual(set().union(*results.values()), expected)
+        self.assertEqual(results['http://down.com'], set())
+
+
+def fake_get_links(url, strict=False, max_bytes=None):
+    if 'down' in url:
+        raise OSError('Failed to resolve\nhost down.example')
+    if 'empty' in url:
+        return set()
+    return {url + '/a', url + '/b'}
+
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(link_extractor, 'get_links', fake_get_links)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'link.sock')
+
+    def start_server(self):
+        # serve() runs forever, so it is left in a daemon thread
+        threading.Thread(target=link_extractor.serve, args=(self.path,), daemon=True).start()
+        for _ in range(100):
+            if os.path.exists(self.path):
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    if sock.connect_ex(self.path) == 0:
+                        return
+            time.sleep(0.01)
+        self.fail('the server did not start')
+
+    def test_links(self):
+        self.start_server()
+        self.assertEqual(get_links_from_server(self.path, 'http://ok'), {'http://ok/a', 'http://ok/b'})
+        # An empty reply is just the terminating empty line
+        self.assertEqual(get_links_from_server(self.path, 'http://empty'), set())
+
+    def test_error_reply(self):
+        self.start_server()
+        with self.assertRaisesRegex(RuntimeError, 'http://down: OSError: Failed to resolve host down.example'):
+            get_links_from_server(self.path, 'http://down')
+        # The server keeps answering after an error
+        self.assertEqual(get_links_from_server(self.path, 'http://ok'), {'http://ok/a', 'http://ok/b'})
+
+    def test_stale_socket_is_replaced(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(self.path)
+        self.start_server()
+        self.assertEqual(get_links_from_server(self.path, 'http://ok'), {'http://ok/a', 'http://ok/b'})
+
+    def test_refuses_live_socket(self):
+        self.start_server()
+        with self.assertRaisesRegex(RuntimeError, 'already listening'):
+            link_extractor.serve(self.path)
+
+    def test_refuses_regular_file(self):
+        with open(self.path, 'w') as f:
+            f.write('keep')
+        with self.assertRaisesRegex(RuntimeError, 'not a socket'):
+            link_extractor.serve(self.path)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), 'keep')
+
+
+if __name__ == '__main__':
+    unittest.main()